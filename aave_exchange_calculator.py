@@ -1,11 +1,25 @@
 from web3 import Web3
-from typing import Dict, Optional
-from decimal import Decimal
+from web3.exceptions import BadFunctionCallOutput
+from typing import Any, Callable, ClassVar, Dict, Iterable, List, Mapping, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal, localcontext
+import functools
 import json
+import operator
+try:
+    import orjson
+except ImportError:
+    import json as orjson
 from pathlib import Path
+from types import MappingProxyType
 import os
+import threading
+import cachetools
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
-from token_config import TOKENS, TokenConfig
+from token_config import LENDING_POOL_ADDRESS, TOKENS, TokenConfig
 
 env_path = Path('.env')
 if not env_path.exists():
@@ -14,28 +28,108 @@ if not env_path.exists():
     )
 load_dotenv(env_path)
 
+RAY = 10**27
+RAY_SQ = RAY * RAY
+
+# Calldata for the nullary aToken getNormalizedIncome() view, encoded once
+GET_NORMALIZED_INCOME_CALLDATA = Web3.to_hex(Web3.keccak(text='getNormalizedIncome()')[:4])
+
+# Checksummed contract addresses by name, built once at import
+CONTRACT_ADDRESSES: Mapping[str, str] = MappingProxyType({
+    'lending_pool': LENDING_POOL_ADDRESS,
+    **{symbol: config.underlying_address for symbol, config in TOKENS.items()},
+    **{f'a{symbol}': config.atoken_address for symbol, config in TOKENS.items()},
+})
+
+
+@functools.lru_cache(maxsize=None)
+def _load_abi(filename: str) -> Dict:
+    """Load ABI from json file with path handling, cached per filename"""
+    try:
+        abi_path = Path('abis') / filename
+        if not abi_path.exists():
+            raise FileNotFoundError(f"ABI file not found: {abi_path}")
+        
+        with abi_path.open('rb') as f:
+            return orjson.loads(f.read())
+    except json.JSONDecodeError:
+        raise ValueError(f"Invalid JSON in ABI file: {filename}")
+
+
+def _decode_normalized_income(symbol: str, data: Any) -> int:
+    """Decode getNormalizedIncome() return data (bytes or hex string) as one uint256"""
+    try:
+        raw = Web3.to_bytes(hexstr=data) if isinstance(data, str) else bytes(data)
+    except (TypeError, ValueError):
+        raw = None
+    if raw is None or len(raw) != 32:
+        raise BadFunctionCallOutput(
+            f"Could not decode getNormalizedIncome() output for a{symbol}: expected 32 bytes, "
+            f"got {data!r}. Is {CONTRACT_ADDRESSES[f'a{symbol}']} a deployed aToken?"
+        )
+    return int.from_bytes(raw, 'big')
+
+
+class BatchRequestError(ValueError):
+    """Raised when a JSON-RPC batch response is malformed or doesn't match its request"""
+
+
+class BatchNotSupportedError(BatchRequestError):
+    """Raised when the node answers a JSON-RPC batch with a single error instead of a list"""
+
+
+class _SessionHTTPProvider(Web3.HTTPProvider):
+    """HTTPProvider that sends every request through one given requests.Session
+    
+    web3 registers a session passed to HTTPProvider only for the creating thread;
+    requests from any other thread would get a fresh default session instead.
+    """
+    
+    # Drop web3's http_retry_request middleware; the session's Retry is the only retry layer
+    _middlewares = ()
+    
+    def __init__(self, endpoint_uri: str, session: requests.Session, request_kwargs: Optional[Dict] = None):
+        super().__init__(endpoint_uri, request_kwargs=request_kwargs)
+        self._session = session
+
+    def make_request(self, method: str, params: Any) -> Dict[str, Any]:
+        request_data = self.encode_rpc_request(method, params)
+        response = self._session.post(self.endpoint_uri, data=request_data, **self.get_request_kwargs())
+        response.raise_for_status()
+        return self.decode_rpc_response(response.content)
+
+
 class AaveDataProvider:
     """Data provider for fetching on-chain data from Aave contracts"""
     
-    def __init__(self, infura_api_key: str = None):
+    # Connected clients and HTTP sessions shared by all providers, keyed by RPC URL
+    _w3_cache: ClassVar[Dict[str, Web3]] = {}
+    _session_cache: ClassVar[Dict[str, requests.Session]] = {}
+    
+    def __init__(self,
+                 infura_api_key: str = None,
+                 verify_contracts: bool = False,
+                 cache_ttl_seconds: float = 12.0):
         # Load environment and initialize Web3
         self.api_key = infura_api_key or os.getenv('INFURA_API_KEY')
         if not self.api_key:
             raise ValueError("No Infura API key provided")
             
         self.rpc_url = f"https://mainnet.infura.io/v3/{self.api_key}"
+        self.verify_contracts = verify_contracts
+        self._session = self._session_cache.get(self.rpc_url)
+        if self._session is None:
+            self._session = self._session_cache[self.rpc_url] = self._create_session()
         
-        # Initialize addresses with lending pool
-        self.addresses = {
-            'lending_pool': Web3.to_checksum_address('0x7d2768dE32b0b80b7a3454c06BdAc94A69DDc7A9')
-        }
-        # Add token addresses
-        for symbol, config in TOKENS.items():
-            self.addresses[symbol] = Web3.to_checksum_address(config.underlying_address)
-            self.addresses[f'a{symbol}'] = Web3.to_checksum_address(config.atoken_address)
+        # Lending pool and token addresses, checksummed at import
+        self.addresses = dict(CONTRACT_ADDRESSES)
         
-        # Cache for normalized income values
-        self._normalized_incomes: Dict[str, Optional[int]] = {symbol: None for symbol in TOKENS}
+        # Cache for normalized income values, keyed by symbol.
+        # The default TTL matches Ethereum's ~12 s block time.
+        self._ni_cache = cachetools.TTLCache(maxsize=32, ttl=cache_ttl_seconds)
+        self._ni_cache_lock = threading.Lock()
+        # Per-token locks so concurrent callers don't issue duplicate in-flight RPCs
+        self._fetch_locks: Dict[str, threading.Lock] = {symbol: threading.Lock() for symbol in TOKENS}
         
         try:
             self.w3 = self._initialize_web3(self.rpc_url)
@@ -43,33 +137,68 @@ class AaveDataProvider:
         except Exception as e:
             raise Exception(f"Failed to initialize: {str(e)}")
 
-    def _initialize_web3(self, rpc_url: str, max_retries: int = 3) -> Web3:
-        """Initialize Web3 with retry mechanism"""
-        for attempt in range(max_retries):
-            try:
-                w3 = Web3(Web3.HTTPProvider(rpc_url))
-                if w3.is_connected():
-                    # Verify contracts are deployed
-                    for name, address in self.addresses.items():
-                        if not w3.eth.get_code(address):
-                            raise ValueError(f"No contract found at {name} address: {address}")
-                    return w3
-            except Exception as e:
-                if attempt == max_retries - 1:
-                    raise ConnectionError(f"Failed to connect to Ethereum node after {max_retries} attempts: {str(e)}")
-        raise ConnectionError("Failed to connect to Ethereum node")
+    def _initialize_web3(self, rpc_url: str) -> Web3:
+        """Initialize Web3, reusing a connected client for the same RPC URL if one exists"""
+        w3 = self._w3_cache.get(rpc_url)
+        if w3 is None:
+            w3 = self._connect_web3(rpc_url)
+            self._w3_cache[rpc_url] = w3
+        
+        if self.verify_contracts:
+            self._verify_contracts()
+        return w3
+
+    def _connect_web3(self, rpc_url: str) -> Web3:
+        """Connect to the node; the session retries transient failures with backoff"""
+        w3 = Web3(_SessionHTTPProvider(rpc_url, self._session, request_kwargs={'timeout': 30}))
+        try:
+            w3.is_connected(show_traceback=True)
+        except Exception as e:
+            raise ConnectionError(f"Failed to connect to Ethereum node: {str(e)}")
+        return w3
+
+    @staticmethod
+    def _create_session() -> requests.Session:
+        """Create a pooled HTTP session with retries, shared by web3 and batch requests"""
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=16,
+            pool_maxsize=16,
+            # The only retry layer: JSON-RPC reads are idempotent, so POSTs are
+            # retried too, including on rate limiting and gateway errors
+            max_retries=Retry(
+                total=3,
+                backoff_factor=0.2,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=None
+            )
+        )
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def _verify_contracts(self) -> None:
+        """Verify contracts are deployed, using one batched eth_getCode request"""
+        names = list(self.addresses)
+        calls = [('eth_getCode', [self.addresses[name], 'latest']) for name in names]
+        for name, reply in zip(names, self._batch_rpc(calls)):
+            if 'error' in reply:
+                raise ValueError(f"Failed to fetch code for {name}: {reply['error']}")
+            code = reply['result']
+            if not code or code == '0x':
+                raise ValueError(f"No contract found at {name} address: {self.addresses[name]}")
 
     def _initialize_contracts(self) -> Dict:
         """Initialize contract instances for all tokens"""
         contracts = {
             'lending_pool': self.w3.eth.contract(
                 address=self.addresses['lending_pool'],
-                abi=self._load_abi('lending_pool_abi.json')
+                abi=_load_abi('lending_pool_abi.json')
             )
         }
         
         # Initialize aToken contracts
-        atoken_abi = self._load_abi('atoken_abi.json')
+        atoken_abi = _load_abi('atoken_abi.json')
         for symbol, config in TOKENS.items():
             contracts[f'a{symbol}'] = self.w3.eth.contract(
                 address=self.addresses[f'a{symbol}'],
@@ -78,43 +207,156 @@ class AaveDataProvider:
             
         return contracts
 
-    @staticmethod
-    def _load_abi(filename: str) -> Dict:
-        """Load ABI from json file with path handling"""
-        try:
-            abi_path = Path('abis') / filename
-            if not abi_path.exists():
-                raise FileNotFoundError(f"ABI file not found: {abi_path}")
-            
-            with abi_path.open() as f:
-                return json.load(f)
-        except json.JSONDecodeError:
-            raise ValueError(f"Invalid JSON in ABI file: {filename}")
-
     def get_normalized_income(self, symbol: str) -> int:
         """Get normalized income for specific token"""
         if symbol not in TOKENS:
             raise ValueError(f"Unsupported token: {symbol}")
             
-        if self._normalized_incomes[symbol] is None:
-            contract = self.contracts[f'a{symbol}']
-            self._normalized_incomes[symbol] = contract.functions.getNormalizedIncome().call()
+        with self._fetch_locks[symbol]:
+            return self._fetch_normalized_income(symbol)
+
+    @cachetools.cachedmethod(
+        operator.attrgetter('_ni_cache'),
+        key=lambda self, symbol: symbol,
+        lock=operator.attrgetter('_ni_cache_lock')
+    )
+    def _fetch_normalized_income(self, symbol: str) -> int:
+        """Fetch normalized income from chain, cached until the TTL expires"""
+        # Raw eth_call with pre-encoded calldata skips the contract proxy and ABI codec
+        result = self.w3.eth.call({
+            'to': self.addresses[f'a{symbol}'],
+            'data': GET_NORMALIZED_INCOME_CALLDATA
+        })
+        return _decode_normalized_income(symbol, result)
+
+    def prefetch_normalized_incomes(self, symbols: Iterable[str]) -> None:
+        """Fetch normalized income for several tokens in one JSON-RPC batch
+        
+        Successful results are cached even if other tokens in the batch fail;
+        the failures are then raised together as a ValueError.
+        """
+        symbols = list(symbols)
+        for symbol in symbols:
+            if symbol not in TOKENS:
+                raise ValueError(f"Unsupported token: {symbol}")
+        if not symbols:
+            return
+            
+        calls = [
+            ('eth_call', [{'to': self.addresses[f'a{symbol}'], 'data': GET_NORMALIZED_INCOME_CALLDATA}, 'latest'])
+            for symbol in symbols
+        ]
+            
+        # Keep the round-trip outside the cache lock so cached reads aren't blocked
+        replies = self._batch_rpc(calls)
+        
+        incomes = {}
+        failures = {}
+        for symbol, reply in zip(symbols, replies):
+            if 'error' in reply:
+                failures[symbol] = reply['error']
+                continue
+            try:
+                incomes[symbol] = _decode_normalized_income(symbol, reply['result'])
+            except BadFunctionCallOutput as e:
+                failures[symbol] = str(e)
+                
+        with self._ni_cache_lock:
+            self._ni_cache.update(incomes)
+        if failures:
+            raise ValueError(f"Failed to fetch normalized income for: {failures}")
+
+    def prefetch_all(self) -> Dict[str, int]:
+        """Fetch normalized income for all tokens concurrently, without JSON-RPC batching
+        
+        Workers share the provider's pooled session, so this costs about one round-trip.
+        """
+        with ThreadPoolExecutor(max_workers=len(TOKENS)) as executor:
+            return dict(zip(TOKENS, executor.map(self.get_normalized_income, TOKENS)))
+
+    def _batch_rpc(self, calls: List[tuple]) -> List[Dict[str, Any]]:
+        """Send (method, params) pairs as a single JSON-RPC batch, replies in call order
+        
+        Each reply is a JSON-RPC response object holding either 'result' or 'error'.
+        """
+        payload = [
+            {'jsonrpc': '2.0', 'id': i, 'method': method, 'params': params}
+            for i, (method, params) in enumerate(calls)
+        ]
+        response = self._session.post(self.rpc_url, json=payload, timeout=30)
+        response.raise_for_status()
+        
+        try:
+            replies = response.json()
+        except ValueError:
+            raise BatchRequestError(f"Invalid JSON in batch response: {response.text[:200]}")
+        return self._parse_batch_replies(replies, len(calls))
+
+    @staticmethod
+    def _parse_batch_replies(replies: Any, expected: int) -> List[Dict[str, Any]]:
+        """Order batch replies by id, checking there is exactly one per request"""
+        if not isinstance(replies, list):
+            raise BatchNotSupportedError(f"Batch request rejected by node: {replies}")
+        if len(replies) != expected:
+            raise BatchRequestError(f"Expected {expected} batch replies, got {len(replies)}")
             
-        return self._normalized_incomes[symbol]
+        ordered: List[Optional[Dict[str, Any]]] = [None] * expected
+        for reply in replies:
+            reply_id = reply.get('id') if isinstance(reply, dict) else None
+            if type(reply_id) is not int or not 0 <= reply_id < expected:
+                raise BatchRequestError(f"Batch reply has invalid id: {reply}")
+            if ordered[reply_id] is not None:
+                raise BatchRequestError(f"Duplicate batch reply for id {reply_id}")
+            if 'result' not in reply and 'error' not in reply:
+                raise BatchRequestError(f"Batch reply {reply_id} has neither result nor error")
+            ordered[reply_id] = reply
+        return ordered
 
     def refresh_data(self, symbol: str = None):
         """Refresh cached data for one or all tokens"""
         if symbol:
-            if symbol in self._normalized_incomes:
-                self._normalized_incomes[symbol] = None
+            with self._ni_cache_lock:
+                self._ni_cache.pop(symbol, None)
         else:
-            self._normalized_incomes = {symbol: None for symbol in TOKENS}
+            with self._ni_cache_lock:
+                self._ni_cache.clear()
+
+
+def _make_atoken_kernel(symbol: str, scale: int) -> Callable[[int, int], int]:
+    """Build an unchecked token -> aToken converter with the token scale bound in"""
+    ray_sq = RAY_SQ
+    
+    def kernel(amount: int, normalized_income: int) -> int:
+        return (amount * ray_sq) // (scale * normalized_income)
+    
+    kernel.__name__ = kernel.__qualname__ = f"atoken_for_{symbol}"
+    return kernel
+
+
+def _make_token_kernel(symbol: str, scale: int) -> Callable[[int, int], int]:
+    """Build an unchecked aToken -> token converter with the token scale bound in"""
+    ray_sq = RAY_SQ
+    
+    def kernel(atoken_amount: int, normalized_income: int) -> int:
+        return (atoken_amount * normalized_income * scale) // ray_sq
+    
+    kernel.__name__ = kernel.__qualname__ = f"token_for_a{symbol}"
+    return kernel
 
 
 class AaveCalculator:
     """Calculator for token/aToken exchange rates"""
     
-    RAY = Decimal('1e27')
+    RAY = RAY
+    
+    # Per-token converters specialized at import; callers must validate inputs themselves.
+    # They repeat the _calculate_*_unchecked formulas so calls skip the extra frame.
+    ATOKEN_FOR: Dict[str, Callable[[int, int], int]] = {
+        symbol: _make_atoken_kernel(symbol, config.scale) for symbol, config in TOKENS.items()
+    }
+    TOKEN_FOR: Dict[str, Callable[[int, int], int]] = {
+        symbol: _make_token_kernel(symbol, config.scale) for symbol, config in TOKENS.items()
+    }
     
     @classmethod
     def calculate_atoken_for_token(cls, 
@@ -125,13 +367,7 @@ class AaveCalculator:
         cls._validate_inputs(amount, normalized_income)
         
         try:
-            token_decimals = Decimal(f'1e{token_config.decimals}')
-            amount_decimal = Decimal(str(amount))
-            normalized_income_decimal = Decimal(str(normalized_income))
-            
-            result = (amount_decimal * cls.RAY * cls.RAY) / (token_decimals * normalized_income_decimal)
-            
-            return int(result)
+            return cls._calculate_atoken_for_token_unchecked(amount, normalized_income, token_config.scale)
         except Exception as e:
             raise Exception(f"Failed to calculate aToken amount: {str(e)}")
 
@@ -144,29 +380,88 @@ class AaveCalculator:
         cls._validate_inputs(atoken_amount, normalized_income)
         
         try:
-            token_decimals = Decimal(f'1e{token_config.decimals}')
-            atoken_decimal = Decimal(str(atoken_amount))
-            normalized_income_decimal = Decimal(str(normalized_income))
-            
-            result = (atoken_decimal * normalized_income_decimal * token_decimals) / (cls.RAY * cls.RAY)
-            
-            return int(result)
+            return cls._calculate_token_for_atoken_unchecked(atoken_amount, normalized_income, token_config.scale)
         except Exception as e:
             raise Exception(f"Failed to calculate token amount: {str(e)}")
 
+    @classmethod
+    def roundtrip(cls,
+                  amount: int,
+                  normalized_income: int,
+                  token_config: TokenConfig) -> Tuple[int, int, int]:
+        """Deposit then withdraw amount; returns (atoken_amount, token_received, rounding_loss)"""
+        cls._validate_inputs(amount, normalized_income)
+        
+        scale = token_config.scale
+        atoken_amount = cls._calculate_atoken_for_token_unchecked(amount, normalized_income, scale)
+        token_received = cls._calculate_token_for_atoken_unchecked(atoken_amount, normalized_income, scale)
+        return atoken_amount, token_received, amount - token_received
+
+    @classmethod
+    def batch_atoken_for_token(cls,
+                               amounts: Iterable[int],
+                               normalized_income: int,
+                               token_config: TokenConfig) -> List[int]:
+        """Calculate aToken amounts for many token amounts at one normalized income"""
+        amounts = list(amounts)
+        for amount in amounts:
+            cls._validate_inputs(amount, normalized_income)
+        
+        convert = cls._calculate_atoken_for_token_unchecked
+        scale = token_config.scale
+        return [convert(amount, normalized_income, scale) for amount in amounts]
+
+    @classmethod
+    def batch_token_for_atoken(cls,
+                               atoken_amounts: Iterable[int],
+                               normalized_income: int,
+                               token_config: TokenConfig) -> List[int]:
+        """Calculate token amounts for many aToken amounts at one normalized income"""
+        atoken_amounts = list(atoken_amounts)
+        for atoken_amount in atoken_amounts:
+            cls._validate_inputs(atoken_amount, normalized_income)
+        
+        convert = cls._calculate_token_for_atoken_unchecked
+        scale = token_config.scale
+        return [convert(atoken_amount, normalized_income, scale) for atoken_amount in atoken_amounts]
+
+    @staticmethod
+    def _calculate_atoken_for_token_unchecked(amount: int, normalized_income: int, scale: int) -> int:
+        """aToken amount for a token amount; inputs must already be validated"""
+        return (amount * RAY_SQ) // (scale * normalized_income)
+
+    @staticmethod
+    def _calculate_token_for_atoken_unchecked(atoken_amount: int, normalized_income: int, scale: int) -> int:
+        """Token amount for an aToken amount; inputs must already be validated"""
+        return (atoken_amount * normalized_income * scale) // RAY_SQ
+
     @staticmethod
     def _validate_inputs(amount: int, normalized_income: int) -> None:
         """Validate input parameters"""
-        if not isinstance(amount, (int, float)) or amount <= 0:
-            raise ValueError("Amount must be a positive number")
-        if not isinstance(normalized_income, (int, float)) or normalized_income <= 0:
-            raise ValueError("Normalized income must be a positive number")
+        if not isinstance(amount, int) or amount <= 0:
+            raise ValueError("Amount must be a positive integer")
+        if not isinstance(normalized_income, int) or normalized_income <= 0:
+            raise ValueError("Normalized income must be a positive integer")
+
+
 
+def format_amount(amount: int, scale: int) -> str:
+    """Format token amount using its integer scale (10**decimals), truncated to 6 decimals"""
+    try:
+        sign = '-' if amount < 0 else ''
+        whole, remainder = divmod(abs(amount), scale)
+        return f"{sign}{whole}.{remainder * 10**6 // scale:06d}"
+    except Exception as e:
+        raise ValueError(f"Failed to format amount: {str(e)}")
 
-def format_amount(amount: int, decimals: int) -> str:
-    """Format token amount with proper decimals"""
+
+def format_amount_exact(amount: int, scale: int) -> str:
+    """Format token amount with Decimal, rounding half-even to 6 decimals"""
     try:
-        return f"{Decimal(str(amount)) / Decimal(10**decimals):.6f}"
+        with localcontext() as ctx:
+            # Enough precision that the division itself never rounds
+            ctx.prec = max(ctx.prec, len(str(abs(amount))) + 7)
+            return f"{Decimal(amount) / scale:.6f}"
     except Exception as e:
         raise ValueError(f"Failed to format amount: {str(e)}")
 
@@ -184,6 +479,18 @@ if __name__ == "__main__":
             'USDT': 1000 * 10**6,    # 1000 USDT
         }
         
+        # Fetch all normalized incomes in a single round-trip, or concurrently
+        # if the endpoint doesn't accept JSON-RPC batches. Prefetching is
+        # best-effort: any token it misses is fetched, and its error reported,
+        # individually in the loop below.
+        try:
+            try:
+                data_provider.prefetch_normalized_incomes(test_amounts)
+            except BatchNotSupportedError:
+                data_provider.prefetch_all()
+        except Exception as e:
+            print(f"Prefetch failed, fetching tokens individually: {str(e)}")
+        
         print("\nAave V2 Token Exchange Rates:")
         print("-" * 50)
         
@@ -192,24 +499,19 @@ if __name__ == "__main__":
                 token_config = TOKENS[symbol]
                 normalized_income = data_provider.get_normalized_income(symbol)
                 
-                # Calculate exchange amounts
-                atoken_amount = AaveCalculator.calculate_atoken_for_token(
+                # Calculate exchange amounts for a deposit followed by a withdrawal
+                atoken_amount, token_received, _ = AaveCalculator.roundtrip(
                     amount,
                     normalized_income,
                     token_config
                 )
                 
-                token_received = AaveCalculator.calculate_token_for_atoken(
-                    atoken_amount,
-                    normalized_income,
-                    token_config
-                )
-                
                 # Print results
                 print(f"\n{token_config.description} ({symbol}) Exchange:")
-                print(f"Deposit: {format_amount(amount, token_config.decimals)} {symbol}")
-                print(f"Receive: {format_amount(atoken_amount, token_config.decimals)} a{symbol}")
-                print(f"Withdrawable: {format_amount(token_received, token_config.decimals)} {symbol}")
+                print(f"Deposit: {format_amount(amount, token_config.scale)} {symbol}")
+                # aToken amounts from the calculator are RAY-scaled (27 decimals)
+                print(f"Receive: {format_amount(atoken_amount, RAY)} a{symbol}")
+                print(f"Withdrawable: {format_amount(token_received, token_config.scale)} {symbol}")
                 
             except Exception as e:
                 print(f"Error processing {symbol}: {str(e)}")
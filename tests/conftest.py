@@ -0,0 +1,61 @@
+"""Shared test setup.
+
+aave_exchange_calculator refuses to import without a .env file in the
+working directory, so the tests run from a scratch directory that has one.
+"""
+import json as jsonlib
+import os
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+_workdir = Path(tempfile.mkdtemp(prefix='aavetest-'))
+(_workdir / '.env').write_text('INFURA_API_KEY=test\n')
+os.chdir(_workdir)
+
+from aave_exchange_calculator import AaveDataProvider  # noqa: E402
+
+
+class FakeResponse:
+    def __init__(self, body):
+        self._body = body
+        self.text = str(body)
+        self.content = b'' if isinstance(body, Exception) else jsonlib.dumps(body).encode()
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        if isinstance(self._body, Exception):
+            raise self._body
+        return self._body
+
+
+class FakeSession:
+    """Stands in for requests.Session, answering each POST with a canned body"""
+
+    def __init__(self, body):
+        self.body = body
+        self.payloads = []
+        self._lock = threading.Lock()
+
+    def post(self, url, json=None, data=None, **kwargs):
+        payload = json if json is not None else jsonlib.loads(data)
+        with self._lock:
+            self.payloads.append(payload)
+        body = self.body(payload) if callable(self.body) else self.body
+        return FakeResponse(body)
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    """An AaveDataProvider that never touches the network"""
+    monkeypatch.setattr(AaveDataProvider, '_initialize_web3', lambda self, rpc_url: None)
+    monkeypatch.setattr(AaveDataProvider, '_initialize_contracts', lambda self: {})
+    return AaveDataProvider(infura_api_key='test', cache_ttl_seconds=60)
@@ -0,0 +1,60 @@
+import random
+
+import pytest
+
+from aave_exchange_calculator import RAY, AaveCalculator, format_amount, format_amount_exact
+from token_config import TOKENS
+
+NORMALIZED_INCOME = RAY * 105 // 100
+
+
+@pytest.mark.parametrize('symbol', list(TOKENS))
+def test_exact_int_conversion(symbol):
+    config = TOKENS[symbol]
+    amount = 1000 * config.scale
+    atoken_amount = AaveCalculator.calculate_atoken_for_token(amount, NORMALIZED_INCOME, config)
+    # 1000 tokens at a 1.05 index is 952.38... aTokens, RAY-scaled
+    assert atoken_amount == 1000 * RAY * RAY // NORMALIZED_INCOME
+    assert AaveCalculator.calculate_token_for_atoken(atoken_amount, NORMALIZED_INCOME, config) == amount - 1
+
+
+@pytest.mark.parametrize('symbol', list(TOKENS))
+def test_fast_paths_agree_with_checked_methods(symbol):
+    config = TOKENS[symbol]
+    rng = random.Random(symbol)
+    amounts = [rng.randint(1, 10**30) for _ in range(50)]
+    atokens = [AaveCalculator.calculate_atoken_for_token(a, NORMALIZED_INCOME, config) for a in amounts]
+    tokens = [AaveCalculator.calculate_token_for_atoken(a, NORMALIZED_INCOME, config) for a in atokens]
+
+    assert [AaveCalculator.ATOKEN_FOR[symbol](a, NORMALIZED_INCOME) for a in amounts] == atokens
+    assert [AaveCalculator.TOKEN_FOR[symbol](a, NORMALIZED_INCOME) for a in atokens] == tokens
+    assert AaveCalculator.batch_atoken_for_token(amounts, NORMALIZED_INCOME, config) == atokens
+    assert AaveCalculator.batch_token_for_atoken(atokens, NORMALIZED_INCOME, config) == tokens
+    assert [AaveCalculator.roundtrip(a, NORMALIZED_INCOME, config) for a in amounts] == [
+        (x, y, a - y) for a, x, y in zip(amounts, atokens, tokens)
+    ]
+
+
+@pytest.mark.parametrize('amount, normalized_income', [
+    (0, RAY), (-1, RAY), (1.5, RAY), ('1', RAY), (1, 0), (1, float(RAY)),
+])
+def test_rejects_invalid_inputs(amount, normalized_income):
+    with pytest.raises(ValueError):
+        AaveCalculator.calculate_atoken_for_token(amount, normalized_income, TOKENS['DAI'])
+
+
+@pytest.mark.parametrize('amount, scale, expected', [
+    (1234567891, 10**6, '1234.567891'),
+    (10**21 + 123, 10**18, '1000.000000'),
+    (5, 10**8, '0.000000'),
+    (-1, 10**6, '-0.000001'),
+    (952380952380952380952380952380, 10**6, '952380952380952380952380.952380'),
+    (1000 * RAY * RAY // NORMALIZED_INCOME, RAY, '952.380952'),
+])
+def test_format_amount_truncates_exactly(amount, scale, expected):
+    assert format_amount(amount, scale) == expected
+
+
+def test_format_amount_exact_rounds_without_losing_precision():
+    assert format_amount_exact(1999999999, 10**9) == '2.000000'
+    assert format_amount_exact(952380952380952380952380952380, 10**6) == '952380952380952380952380.952380'
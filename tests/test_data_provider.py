@@ -0,0 +1,214 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from web3.exceptions import BadFunctionCallOutput
+
+from aave_exchange_calculator import (
+    CONTRACT_ADDRESSES,
+    AaveDataProvider,
+    BatchNotSupportedError,
+    BatchRequestError,
+)
+from conftest import FakeSession
+
+NI = 10**27 + 42
+
+
+def uint256_hex(value):
+    return '0x' + value.to_bytes(32, 'big').hex()
+
+
+def echo_results(result_for):
+    """Batch responder that answers every request in the payload"""
+    def respond(payload):
+        return [{'jsonrpc': '2.0', 'id': req['id'], **result_for(req)} for req in payload]
+    return respond
+
+
+class TestParseBatchReplies:
+    parse = staticmethod(AaveDataProvider._parse_batch_replies)
+
+    def test_orders_replies_by_id(self):
+        replies = [{'id': 1, 'result': 'b'}, {'id': 0, 'result': 'a'}]
+        assert [r['result'] for r in self.parse(replies, 2)] == ['a', 'b']
+
+    def test_single_error_object_means_batch_not_supported(self):
+        with pytest.raises(BatchNotSupportedError):
+            self.parse({'jsonrpc': '2.0', 'id': None, 'error': {'message': 'batch not supported'}}, 2)
+
+    def test_keeps_error_replies(self):
+        replies = [{'id': 0, 'error': {'message': 'execution reverted'}}]
+        assert self.parse(replies, 1) == replies
+
+    @pytest.mark.parametrize('replies', [
+        {'jsonrpc': '2.0', 'id': None, 'error': {'message': 'batch not supported'}},
+        [{'id': 0, 'result': '0x'}],
+        [{'id': 0, 'result': '0x'}, {'id': 1, 'result': '0x'}, {'id': 2, 'result': '0x'}],
+        [{'id': None, 'error': {'message': 'parse error'}}, {'id': 1, 'result': '0x'}],
+        [{'id': 0, 'result': '0x'}, {'id': 5, 'result': '0x'}],
+        [{'id': '0', 'result': '0x'}, {'id': 1, 'result': '0x'}],
+        [{'id': 0, 'result': '0x'}, {'id': 0, 'result': '0x'}],
+        [{'id': 0, 'result': '0x'}, {'id': 1}],
+        [{'id': 0, 'result': '0x'}, 'garbage'],
+    ], ids=['not-a-list', 'too-few', 'too-many', 'null-id', 'out-of-range',
+            'string-id', 'duplicate', 'no-result', 'not-an-object'])
+    def test_rejects_malformed_batches(self, replies):
+        with pytest.raises(BatchRequestError):
+            self.parse(replies, 2)
+
+
+class TestPrefetchNormalizedIncomes:
+    def test_single_post_fills_cache(self, provider):
+        provider._session = FakeSession(echo_results(lambda req: {'result': uint256_hex(NI)}))
+        provider.prefetch_normalized_incomes(['USDC', 'DAI'])
+
+        assert len(provider._session.payloads) == 1
+        assert [req['method'] for req in provider._session.payloads[0]] == ['eth_call', 'eth_call']
+        provider.w3 = None  # any RPC from here on would fail
+        assert provider.get_normalized_income('USDC') == NI
+        assert provider.get_normalized_income('DAI') == NI
+
+    def test_caches_good_tokens_when_one_reverts(self, provider):
+        def result_for(req):
+            if req['params'][0]['to'] == provider.addresses['aWBTC']:
+                return {'error': {'code': 3, 'message': 'execution reverted'}}
+            return {'result': uint256_hex(NI)}
+        provider._session = FakeSession(echo_results(result_for))
+
+        with pytest.raises(ValueError, match='WBTC'):
+            provider.prefetch_normalized_incomes(['USDC', 'WBTC'])
+        assert 'USDC' in provider._ni_cache
+        assert 'WBTC' not in provider._ni_cache
+
+    def test_malformed_response_raises_batch_error(self, provider):
+        provider._session = FakeSession([{'id': 0, 'result': uint256_hex(NI)}])
+        with pytest.raises(BatchRequestError) as excinfo:
+            provider.prefetch_normalized_incomes(['USDC', 'DAI'])
+        assert not isinstance(excinfo.value, BatchNotSupportedError)
+
+    def test_non_json_response_raises_batch_error(self, provider):
+        provider._session = FakeSession(ValueError('Expecting value'))
+        with pytest.raises(BatchRequestError):
+            provider.prefetch_normalized_incomes(['USDC'])
+
+    def test_rejects_unknown_symbol(self, provider):
+        with pytest.raises(ValueError, match='Unsupported token'):
+            provider.prefetch_normalized_incomes(['LINK'])
+
+    def test_cached_reads_not_blocked_by_batch_in_flight(self, provider):
+        provider._session = FakeSession(echo_results(lambda req: {'result': uint256_hex(NI)}))
+        provider.prefetch_normalized_incomes(['DAI'])
+
+        batch_started = threading.Event()
+
+        def slow_batch(payload):
+            batch_started.set()
+            time.sleep(0.5)
+            return echo_results(lambda req: {'result': uint256_hex(NI)})(payload)
+        provider._session = FakeSession(slow_batch)
+        batch = threading.Thread(target=provider.prefetch_normalized_incomes, args=(['USDC'],))
+        batch.start()
+        batch_started.wait()
+
+        started = time.monotonic()
+        assert provider.get_normalized_income('DAI') == NI
+        provider.refresh_data('WETH')
+        assert time.monotonic() - started < 0.2
+        batch.join()
+
+
+class TestNormalizedIncomeCache:
+    @staticmethod
+    def install_counting_node(provider, delay=0.0):
+        calls = []
+
+        def call(tx):
+            calls.append(tx['to'])
+            time.sleep(delay)
+            return (NI + len(calls)).to_bytes(32, 'big')
+
+        provider.w3 = SimpleNamespace(eth=SimpleNamespace(call=call))
+        return calls
+
+    def test_cached_within_ttl(self, provider):
+        calls = self.install_counting_node(provider)
+        assert provider.get_normalized_income('DAI') == provider.get_normalized_income('DAI')
+        assert len(calls) == 1
+
+    def test_refetched_after_ttl(self, provider):
+        calls = self.install_counting_node(provider)
+        first = provider.get_normalized_income('DAI')
+        provider._ni_cache.expire(time.monotonic() + 61)
+        assert provider.get_normalized_income('DAI') != first
+        assert len(calls) == 2
+
+    def test_refresh_data_drops_one_or_all(self, provider):
+        calls = self.install_counting_node(provider)
+        provider.get_normalized_income('DAI')
+        provider.get_normalized_income('USDC')
+        provider.refresh_data('DAI')
+        assert 'DAI' not in provider._ni_cache and 'USDC' in provider._ni_cache
+        provider.refresh_data()
+        assert len(provider._ni_cache) == 0
+
+    def test_concurrent_misses_send_one_rpc(self, provider):
+        calls = self.install_counting_node(provider, delay=0.05)
+        threads = [threading.Thread(target=provider.get_normalized_income, args=('DAI',)) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(calls) == 1
+
+    def test_errors_are_not_cached(self, provider):
+        def call(tx):
+            raise ConnectionError('node down')
+        provider.w3 = SimpleNamespace(eth=SimpleNamespace(call=call))
+        with pytest.raises(ConnectionError):
+            provider.get_normalized_income('DAI')
+        assert 'DAI' not in provider._ni_cache
+
+    def test_rejects_unknown_symbol(self, provider):
+        with pytest.raises(ValueError, match='Unsupported token'):
+            provider.get_normalized_income('LINK')
+
+
+def test_providers_get_independent_address_maps(provider):
+    other = AaveDataProvider(infura_api_key='test')
+    provider.addresses['lending_pool'] = '0x0000000000000000000000000000000000000000'
+    assert other.addresses['lending_pool'] == CONTRACT_ADDRESSES['lending_pool'] != provider.addresses['lending_pool']
+    with pytest.raises(TypeError):
+        CONTRACT_ADDRESSES['lending_pool'] = '0x0'
+
+
+class TestDecodeNormalizedIncome:
+    @pytest.mark.parametrize('empty', [b'', '0x', None])
+    def test_empty_return_data_is_an_error(self, provider, empty):
+        provider.w3 = SimpleNamespace(eth=SimpleNamespace(call=lambda tx: empty))
+        with pytest.raises(BadFunctionCallOutput, match='aDAI'):
+            provider.get_normalized_income('DAI')
+        assert 'DAI' not in provider._ni_cache
+
+    def test_batch_path_uses_the_same_decoder(self, provider):
+        def result_for(req):
+            if req['params'][0]['to'] == provider.addresses['aWBTC']:
+                return {'result': '0x'}
+            return {'result': uint256_hex(NI)}
+        provider._session = FakeSession(echo_results(result_for))
+
+        with pytest.raises(ValueError, match='Could not decode'):
+            provider.prefetch_normalized_incomes(['USDC', 'WBTC'])
+        assert provider._ni_cache['USDC'] == NI
+        assert 'WBTC' not in provider._ni_cache
+
+    @pytest.mark.parametrize('data', [NI.to_bytes(32, 'big'), uint256_hex(NI)])
+    def test_decodes_one_word(self, provider, data):
+        provider.w3 = SimpleNamespace(eth=SimpleNamespace(call=lambda tx: data))
+        assert provider.get_normalized_income('DAI') == NI
+
+    def test_rejects_extra_words(self, provider):
+        provider.w3 = SimpleNamespace(eth=SimpleNamespace(call=lambda tx: bytes(64)))
+        with pytest.raises(BadFunctionCallOutput):
+            provider.get_normalized_income('DAI')
@@ -0,0 +1,67 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+from web3 import Web3
+
+from aave_exchange_calculator import _SessionHTTPProvider
+from conftest import FakeSession
+from token_config import TOKENS
+
+
+def fake_node(request):
+    result = {
+        'web3_clientVersion': 'fake/1.0',
+        'eth_chainId': '0x1',
+        'eth_call': '0x' + (10**27).to_bytes(32, 'big').hex(),
+    }[request['method']]
+    return {'jsonrpc': '2.0', 'id': request['id'], 'result': result}
+
+
+def test_requests_from_worker_threads_use_the_given_session():
+    session = FakeSession(fake_node)
+    w3 = Web3(_SessionHTTPProvider('http://node.invalid', session, request_kwargs={'timeout': 30}))
+    thread_ids = set()
+
+    def probe(_):
+        thread_ids.add(threading.get_ident())
+        return w3.is_connected()
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        assert all(executor.map(probe, range(16)))
+    assert len(thread_ids) > 1
+    assert len(session.payloads) == 16
+
+
+def test_connect_failure_raises_connection_error(provider):
+    class DownSession:
+        def post(self, *args, **kwargs):
+            raise ConnectionRefusedError('refused')
+
+    provider._session = DownSession()
+    with pytest.raises(ConnectionError, match='refused'):
+        provider._connect_web3('http://node.invalid')
+
+
+def test_prefetch_all_workers_share_the_provider_session(provider):
+    session = FakeSession(fake_node)
+    provider.w3 = Web3(_SessionHTTPProvider('http://node.invalid', session))
+
+    assert provider.prefetch_all() == {symbol: 10**27 for symbol in TOKENS}
+    calls = [request for request in session.payloads if request['method'] == 'eth_call']
+    assert len(calls) == len(TOKENS)
+
+
+def test_failed_rpc_is_posted_once():
+    class DownSession:
+        posts = 0
+
+        def post(self, *args, **kwargs):
+            DownSession.posts += 1
+            raise requests.ConnectionError('node down')
+
+    w3 = Web3(_SessionHTTPProvider('http://node.invalid', DownSession()))
+    with pytest.raises(requests.ConnectionError):
+        w3.eth.call({'to': TOKENS['DAI'].atoken_address, 'data': '0x'}, 'latest')
+    assert DownSession.posts == 1
@@ -0,0 +1,31 @@
+import pytest
+from web3 import Web3
+
+from token_config import TOKENS, TokenConfig
+
+
+def test_scale_follows_decimals():
+    for config in TOKENS.values():
+        assert config.scale == 10**config.decimals
+
+
+def test_create_derives_scale_and_checksums():
+    link = TokenConfig.create(
+        '0x514910771af9ca656af840dff83e8264ecf986ca',
+        '0xa06bc25b5805d5f8d82847d191cb4af5a3e873e0',
+        18, 'LINK', 'ChainLink Token'
+    )
+    assert link.scale == 10**18
+    assert link.underlying_address == '0x514910771AF9Ca656af840dff83E8264EcF986CA'
+
+
+def test_scale_has_no_silent_default():
+    with pytest.raises(TypeError):
+        TokenConfig('0x0', '0x0', 18, 'LINK', 'ChainLink Token')
+
+
+def test_addresses_are_checksummed():
+    for config in TOKENS.values():
+        assert config.underlying_address == Web3.to_checksum_address(config.underlying_address)
+        assert config.atoken_address == Web3.to_checksum_address(config.atoken_address)
+